@@ -3,14 +3,19 @@
 
 import logging
 import copy
-import codecs
+import mmap
+import shutil
 import threading
-from xml.dom.minidom import Document, parseString
+import multiprocessing
+import Queue
+from cStringIO import StringIO
+from xml.etree import cElementTree as ElementTree
+from xml.sax.saxutils import quoteattr
 import tempfile
 from gettext import gettext as _
 
 import florun
-from utils import empty, atoi, import_plugins
+from utils import empty, atoi, import_plugins, itersubclasses
 
 
 logger = logging.getLogger(__name__)
@@ -46,6 +51,9 @@ class Flow(object):
         self.modified = False
         self.filename = None
         self._nodes = []
+        #: index of nodes by id, kept in sync with L{nodes}
+        self._nodesbyid = {}
+        self._inputnodes = None
 
     def clone(self):
         return copy.copy(self)
@@ -57,6 +65,8 @@ class Flow(object):
     @nodes.setter
     def nodes(self, nodes):
         self._nodes = nodes
+        self._nodesbyid = dict((n.id, n) for n in nodes)
+        self._inputnodes = None
 
     @property
     def startNodes(self):
@@ -64,7 +74,9 @@ class Flow(object):
 
     @property
     def inputNodes(self):
-        return [n for n in self.nodes if issubclass(n.__class__, InputNode)]
+        if self._inputnodes is None:
+            self._inputnodes = [n for n in self.nodes if isinstance(n, InputNode)]
+        return self._inputnodes
 
     def CLIParameterNodes(self):
         return [n for n in self.nodes
@@ -84,17 +96,16 @@ class Flow(object):
         """
         @param node : L{Node}
         """
-        try:
-            n = self.findNode(node.id)
+        if node.id in self._nodesbyid:
             if node.id:
                 raise FlowError(_("A node with id '%s' already exists.") % node.id)
             else:
                 node.id = self.randomId(node)
-        except NodeNotFoundError, e:
-            pass
         self.modified = True
         node.flow = self
         self.nodes.append(node)
+        self._nodesbyid[node.id] = node
+        self._inputnodes = None
 
     def removeConnector(self, start, end):
         """
@@ -121,6 +132,8 @@ class Flow(object):
             self.nodes.remove(node)
         except ValueError:
             raise FlowError(_("Node not found in flow."))
+        self._nodesbyid.pop(node.id, None)
+        self._inputnodes = None
 
     def randomId(self, node):
         """
@@ -129,7 +142,7 @@ class Flow(object):
         """
         nodeid = "%s" % node.label
         i = 2
-        while nodeid in [n.id for n in self.nodes]:
+        while nodeid in self._nodesbyid:
             nodeid = "%s-%s" % (node.label, i)
             i = i + 1
         return nodeid
@@ -139,10 +152,10 @@ class Flow(object):
         Find node by its id
         @rtype: L{Node}
         """
-        for n in self.nodes:
-            if n.id == nodeid:
-                return n
-        raise NodeNotFoundError(_("Node with id '%s' not found.") % nodeid)
+        try:
+            return self._nodesbyid[nodeid]
+        except KeyError:
+            raise NodeNotFoundError(_("Node with id '%s' not found.") % nodeid)
 
     @staticmethod
     def load(filename):
@@ -151,10 +164,22 @@ class Flow(object):
         @rtype : L{Flow}
         """
         logger.info(_("Load flow from file '%s'") % filename)
-        fd = open(filename)
-        content = fd.read()
-        fd.close()
-        f = Flow.importXml(content)
+        fd = open(filename, 'rb')
+        try:
+            # Map the file instead of reading it : pages are loaded
+            # by the OS as parsing goes on, never the file as a string.
+            try:
+                source = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, mmap.error):
+                # Empty file, or filesystem without mmap support
+                source = fd
+            try:
+                f = Flow.importXml(source)
+            finally:
+                if source is not fd:
+                    source.close()
+        finally:
+            fd.close()
         f.filename = filename
         f.modified = False
         f.sortNodesByIncidence()
@@ -165,11 +190,13 @@ class Flow(object):
             filename = self.filename
         # Update incidence field and sort
         self.sortNodesByIncidence()
-        xml = self.exportXml()
         logger.info(_("Save flow to file '%s'") % filename)
         fd = open(filename, 'w')
-        fd.write(xml)
-        fd.close()
+        try:
+            for line in self._exportXmlLines():
+                fd.write(line + u'\n')
+        finally:
+            fd.close()
         self.modified = False
 
     def sortNodesByIncidence(self):
@@ -188,57 +215,67 @@ class Flow(object):
         self.nodes.sort(cmp=lambda x, y: cmp(x.incidence, y.incidence))
 
     @classmethod
-    def importXml(cls, xmlcontent):
+    def importXml(cls, source):
         """
-        @type xmlcontent: string
+        @type source: file object (or XML string)
         @rtype: L{Flow}
         """
+        if isinstance(source, unicode):
+            source = source.encode('utf-8')
+        if isinstance(source, str):
+            source = StringIO(source)
+
         flow = Flow()
-        dom = parseString(xmlcontent)
 
         import_plugins(florun.plugins_dirs, globals())
-        
-        for xmlnode in dom.getElementsByTagName('node'):
-            nodeid    = xmlnode.getAttribute('id')
-            classname = xmlnode.getAttribute('type')
-            logger.debug(_(u"XML node type %(classname)s with id '%(nodeid)s'") % locals())
+        nodetypes = nodeTypes()
+
+        # Stream <node> elements one by one, and buffer links until
+        # all nodes are known.
+        links = []
+        for event, xmlnode in ElementTree.iterparse(source, events=('end',)):
+            if xmlnode.tag != 'node':
+                continue
+            nodeid    = xmlnode.get('id')
+            classname = xmlnode.get('type')
+            logger.debug(u"XML node type %s with id '%s'", classname, nodeid)
 
             # Dynamic instanciation of node type
-            try:
-                classobj = eval(classname)
-            except:
+            classobj = nodetypes.get(classname)
+            if classobj is None:
                 raise FlowParsingError(_(u"Unknown node type '%s'") % classname)
 
             node = classobj(flow=flow, id=nodeid)
 
             # Load graphical attributes
-            for prop in xmlnode.getElementsByTagName('graphproperty'):
-                name  = prop.getAttribute('name')
-                value = atoi(prop.getAttribute('value'))
-                logger.debug(_(u"XML node property : %s = %s") % (name, value))
+            for prop in xmlnode.findall('graphproperty'):
+                name  = prop.get('name')
+                value = atoi(prop.get('value'))
+                logger.debug(u"XML node property : %s = %s", name, value)
                 node.graphicalprops[name] = value
             flow.addNode(node)
 
-        # Once all nodes have been loaded, load links :
-        for xmlnode in dom.getElementsByTagName('node'):
-            nodeid = xmlnode.getAttribute('id')
-            node   = flow.findNode(nodeid)
-            for xmlinterface in xmlnode.getElementsByTagName('interface'):
-                name = xmlinterface.getAttribute('name')
+            for xmlinterface in xmlnode.findall('interface'):
+                name = xmlinterface.get('name')
                 src  = node.findInterface(name)
                 src.slot = True
                 if src.isInput() and src.isValue():
-                    src.slot = xmlinterface.getAttribute('slot').lower() == 'true'
+                    src.slot = (xmlinterface.get('slot') or '').lower() == 'true'
                     if not src.slot:
-                        src.value = xmlinterface.getAttribute('value')
-                for xmlsuccessor in xmlinterface.getElementsByTagName('successor'):
-                    dnodeid = xmlsuccessor.getAttribute('node')
-                    dnode   = flow.findNode(dnodeid)
-                    # Find interface on destination node
-                    dname = xmlsuccessor.getAttribute('interface')
-                    dest  = dnode.findInterface(dname)
-                    dest.slot = True
-                    src.addSuccessor(dest)
+                        src.value = xmlinterface.get('value') or ''
+                for xmlsuccessor in xmlinterface.findall('successor'):
+                    links.append((src, xmlsuccessor.get('node'),
+                                       xmlsuccessor.get('interface')))
+            # Free children now that the node is loaded
+            xmlnode.clear()
+
+        # Once all nodes have been loaded, load links :
+        for src, dnodeid, dname in links:
+            dnode = flow.findNode(dnodeid)
+            # Find interface on destination node
+            dest  = dnode.findInterface(dname)
+            dest.slot = True
+            src.addSuccessor(dest)
         flow.sortNodesByIncidence()
         return flow
 
@@ -246,45 +283,49 @@ class Flow(object):
         """
         @rtype: string
         """
-        # Document root
-        grxml = Document()
-        grxmlr = grxml.createElement('flow')
-        grxml.appendChild(grxmlr)
+        return u'\n'.join(self._exportXmlLines()) + u'\n'
+
+    def _exportXmlLines(self):
+        """
+        Generator over the XML representation, line by line.
+        Writes markup directly, no DOM tree is built.
+        @rtype: generator of unicode
+        """
+        yield u'<?xml version="1.0" ?>'
+        yield u'<flow>'
         # Each node...
         for node in self.nodes:
-            xmlnode = grxml.createElement('node')
-            xmlnode.setAttribute('id', unicode(node.id))
-            xmlnode.setAttribute('type', unicode(node.fullname()))
-            grxmlr.appendChild(xmlnode)
+            yield u'\t<node id=%s type=%s>' % (quoteattr(u"%s" % node.id),
+                                               quoteattr(u"%s" % node.fullname()))
 
             # Graphical properties
             if not empty(node.graphicalprops):
                 for graphprop in node.graphicalprops:
-                    prop = grxml.createElement('graphproperty')
-                    prop.setAttribute('name', graphprop)
-                    prop.setAttribute('value', "%s" % node.graphicalprops[graphprop])
-                    xmlnode.appendChild(prop)
+                    yield u'\t\t<graphproperty name=%s value=%s/>' % (
+                            quoteattr(graphprop),
+                            quoteattr(u"%s" % node.graphicalprops[graphprop]))
 
             # Interfaces and successors
             for interface in node.interfaces:
-                xmlinterface = grxml.createElement('interface')
-                xmlinterface.setAttribute('name', interface.name)
+                attrs = u'name=%s' % quoteattr(interface.name)
                 if interface.isInput() and interface.isValue():
-                    xmlinterface.setAttribute('slot', "%s" % interface.slot)
+                    attrs += u' slot=%s' % quoteattr(u"%s" % interface.slot)
                     if not interface.slot:
                         val = ''
                         if interface.value is not None:
                             val = interface.value
-                        xmlinterface.setAttribute('value', "%s" % val)
-                if not empty(interface.successors):
+                        attrs += u' value=%s' % quoteattr(u"%s" % val)
+                if empty(interface.successors):
+                    yield u'\t\t<interface %s/>' % attrs
+                else:
+                    yield u'\t\t<interface %s>' % attrs
                     for successor in interface.successors:
-                        xmlsuccessor = grxml.createElement('successor')
-                        xmlsuccessor.setAttribute('node', successor.node.id)
-                        xmlsuccessor.setAttribute('interface', successor.name)
-                        xmlinterface.appendChild(xmlsuccessor)
-                xmlnode.appendChild(xmlinterface)
-
-        return grxml.toprettyxml()
+                        yield u'\t\t\t<successor node=%s interface=%s/>' % (
+                                quoteattr(u"%s" % successor.node.id),
+                                quoteattr(successor.name))
+                    yield u'\t\t</interface>'
+            yield u'\t</node>'
+        yield u'</flow>'
 
 
 class Interface(object):
@@ -300,6 +341,9 @@ class Interface(object):
         """
         self.node = node
         self.name = name
+        #: frozen once, saves a __class__.__name__ chain per access
+        self.classname = self.__class__.__name__
+        node._registerInterface(self)
 
         #: list of {Interface}
         self.successors = []
@@ -312,13 +356,21 @@ class Interface(object):
         self.value   = kwargs.get('value', self.default)
         self.doc     = kwargs.get('doc', '')
 
-        self.__readypredecessors = {}
+        #: the type never changes once built
+        self._isinput = self.type in (self.INPUT, self.PARAMETER)
+        #: neither do class nor name
+        self._fullname = u"%s(%s)" % (self.classname, self.name)
+
+        #: countdown of predecessors whose content is not ready yet,
+        #: maintained by L{addSuccessor}/L{removeSuccessor}
+        self._pendingpredecessors = 0
+        self._readylock = threading.Lock()
 
     def isValue(self):
         return False
 
     def isInput(self):
-        return self.type == self.INPUT or self.type == self.PARAMETER
+        return self._isinput
 
     def isCompatible(self, other):
         """
@@ -343,7 +395,10 @@ class Interface(object):
             raise IncompatibilityError(interface, self)
         self.successors.append(interface)
         interface.predecessors.append(self)
-        logger.debug(_("%s has following successors : %s") % (self, self.successors))
+        interface._pendingpredecessors += 1
+        self.node._invalidateRelatives()
+        interface.node._invalidateRelatives()
+        logger.debug(u"%s has following successors : %s", self, self.successors)
 
     def removeSuccessor(self, interface):
         """
@@ -354,6 +409,9 @@ class Interface(object):
             interface.predecessors.remove(self)
         except ValueError:
             raise FlowError(_("Connector does not exist from %s to %s") % (self, interface))
+        interface._pendingpredecessors -= 1
+        self.node._invalidateRelatives()
+        interface.node._invalidateRelatives()
 
     def load(self, other):
         """
@@ -376,25 +434,28 @@ class Interface(object):
         interface is ready. Notify node.
         @type interface: interface whose content is ready.
         """
-        self.load(interface)
-        self.__readypredecessors[interface] = True
-        if len(self.__readypredecessors.keys()) >= len(self.predecessors):
-            self.node.debug("All predecessors of %s are ready." % self.fullname)
+        if self._loadFrom(interface):
             self.node.onInterfaceReady(self)
 
-    @property
-    def fullname(self):
+    def _loadFrom(self, interface):
         """
-        @rtype : string
+        Load content of one ready predecessor.
+        @rtype: boolean, True once all predecessors were loaded.
         """
-        return u"%s(%s)" % (self.classname, self.name)
+        self.load(interface)
+        with self._readylock:
+            self._pendingpredecessors -= 1
+            ready = self._pendingpredecessors <= 0
+        if ready:
+            self.node.debug("All predecessors of %s are ready." % self.fullname)
+        return ready
 
     @property
-    def classname(self):
+    def fullname(self):
         """
         @rtype : string
         """
-        return self.__class__.__name__
+        return self._fullname
 
     def __str__(self):
         return repr(self)
@@ -417,15 +478,25 @@ class Node(object):
     description = _(u"")
 
     def __init__(self, *args, **kwargs):
+        self._repr = None
+        #: frozen once, saves a __class__.__name__ chain per access
+        self.classname = self.__class__.__name__
         self.flow = kwargs.get('flow', None)
         self.id = kwargs.get('id', '')
         if not self.id and self.flow:
             self.id = self.flow.randomId(self)
         self._interfaces = []
+        self._inputinterfaces  = None
+        self._outputinterfaces = None
+        self._successornodes   = None
+        self._predecessornodes = None
         self.incidence   = 0
         self.graphicalprops = {}
 
-        self.__readyinterfaces = {}
+        #: countdown of input slot interfaces not ready yet,
+        #: initialized at first notification
+        self._pendinginputs = None
+        self._readylock = threading.Lock()
         self.canRun  = threading.Event()
         self.running = False
 
@@ -433,6 +504,15 @@ class Node(object):
     def fullname(cls):
         return "%s.%s" % (cls.__module__, cls.__name__)
 
+    @property
+    def id(self):
+        return self._id
+
+    @id.setter
+    def id(self, value):
+        self._id = value
+        self._repr = None
+
     def applyAttributes(self, entries):
         """
         @type entries : dict
@@ -440,6 +520,9 @@ class Node(object):
         for name, tuple in entries.items():
             value, slot = tuple
             if name == 'id':
+                if self.flow is not None:
+                    self.flow._nodesbyid.pop(self.id, None)
+                    self.flow._nodesbyid[value] = self
                 self.id = value
             else:
                 i = self.findInterface(name)
@@ -462,60 +545,81 @@ class Node(object):
         self.graphicalprops['y'] = y
         return modified
 
-    @property
-    def classname(self):
-        """
-        @rtype : string
-        """
-        return self.__class__.__name__
-
     @property
     def interfaces(self):
         """
-        Dynamically list class attributes that are Interfaces.
+        Interfaces of this node, registered at their creation
+        (see L{Interface.__init__}).
         @rtype : list of L{Interface}
         """
-        if len(self._interfaces) == 0:
-            for attr in self.__dict__.values():
-                if issubclass(attr.__class__, Interface):
-                    self._interfaces.append(attr)
         return self._interfaces
 
+    def _registerInterface(self, interface):
+        """
+        Called from L{Interface.__init__}.
+        @type interface : L{Interface}
+        """
+        self._interfaces.append(interface)
+        self._inputinterfaces  = None
+        self._outputinterfaces = None
+
     @property
     def inputInterfaces(self):
-        return [i for i in self.interfaces if i.isInput()]
+        if self._inputinterfaces is None:
+            self._inputinterfaces = [i for i in self.interfaces if i.isInput()]
+        return self._inputinterfaces
 
     @property
     def inputSlotInterfaces(self):
+        # Not cached : slots are switched when values get connected
         return [i for i in self.inputInterfaces if i.slot]
 
     @property
     def outputInterfaces(self):
-        return [i for i in self.interfaces if not i.isInput()]
+        if self._outputinterfaces is None:
+            self._outputinterfaces = [i for i in self.interfaces if not i.isInput()]
+        return self._outputinterfaces
 
     @property
     def successors(self):
         """
+        Nodes connected downstream, memoized until connectors change.
         @rtype: list of L{Node}
         """
-        successors = []
-        for interface in self.interfaces:
-            for successor in interface.successors:
-                if successor.node not in successors:
-                    successors.append(successor.node)
-        return successors
+        if self._successornodes is None:
+            seen = set()
+            successors = []
+            for interface in self.interfaces:
+                for successor in interface.successors:
+                    if successor.node not in seen:
+                        seen.add(successor.node)
+                        successors.append(successor.node)
+            self._successornodes = successors
+        return self._successornodes
 
     @property
     def predecessors(self):
         """
+        Nodes connected upstream, memoized until connectors change.
         @rtype: list of L{Node}
         """
-        predecessors = []
-        for interface in self.interfaces:
-            for predecessor in interface.predecessors:
-                if predecessor.node not in predecessors:
-                    predecessors.append(predecessor.node)
-        return predecessors
+        if self._predecessornodes is None:
+            seen = set()
+            predecessors = []
+            for interface in self.interfaces:
+                for predecessor in interface.predecessors:
+                    if predecessor.node not in seen:
+                        seen.add(predecessor.node)
+                        predecessors.append(predecessor.node)
+            self._predecessornodes = predecessors
+        return self._predecessornodes
+
+    def _invalidateRelatives(self):
+        """
+        Drop memoized successors/predecessors, after connectors changed.
+        """
+        self._successornodes   = None
+        self._predecessornodes = None
 
     def findInterface(self, name):
         """
@@ -533,8 +637,28 @@ class Node(object):
         When all are ready, execution starts.
         @type interface : L{Interface}
         """
-        self.__readyinterfaces[interface] = True
-        if len(self.__readyinterfaces.keys()) >= len(self.inputSlotInterfaces):
+        self._countReadyInterfaces(1)
+
+    def onEdgesReady(self, edges):
+        """
+        Receives readiness of several connectors targeting this node,
+        counted in a single batch.
+        @type edges : list of (source, destination) L{Interface} couples
+        """
+        ready = 0
+        for source, dest in edges:
+            if dest._loadFrom(source):
+                ready += 1
+        if ready:
+            self._countReadyInterfaces(ready)
+
+    def _countReadyInterfaces(self, count):
+        with self._readylock:
+            if self._pendinginputs is None:
+                self._pendinginputs = len(self.inputSlotInterfaces)
+            self._pendinginputs -= count
+            ready = self._pendinginputs <= 0
+        if ready:
             # Node has all its input interfaces ready
             self.debug("All interfaces are ready, can start.")
             self.canRun.set()
@@ -569,10 +693,21 @@ class Node(object):
 
         self.running = False
         self.canRun.clear()
+        # Group notifications by target node, one batch each
+        notify = {}
         for i in self.outputInterfaces:
             for interface in i.successors:
                 self.debug(_("Notify %s") % interface)
-                interface.onContentReady(i)
+                notify.setdefault(interface.node, []).append((i, interface))
+        for node, edges in notify.items():
+            node.onEdgesReady(edges)
+
+    def stop(self):
+        """
+        Interrupt execution, overridden by {Node} subclasses
+        driving external processes.
+        """
+        pass
 
     def clean(self):
         for i in self.interfaces:
@@ -582,28 +717,30 @@ class Node(object):
         return repr(self)
 
     def __repr__(self):
-        return "%s(%s)" % (self.classname, self.id)
+        if self._repr is None:
+            self._repr = "%s(%s)" % (self.classname, self.id)
+        return self._repr
 
     def __unicode__(self):
         return repr(self)
 
+    # Message formatting is left to the logging module,
+    # it only happens when the level is enabled.
+
     def debug(self, msg):
-        logger.debug(self._logstr(msg))
+        logger.debug(u"%s: %s", self, msg)
 
     def info(self, msg):
-        logger.info(self._logstr(msg))
+        logger.info(u"%s: %s", self, msg)
 
     def error(self, msg):
-        logger.error(self._logstr(msg))
+        logger.error(u"%s: %s", self, msg)
 
     def exception(self, e):
-        logger.exception(self._logstr(e))
+        logger.exception(u"%s: %s", self, e)
 
     def warning(self, msg):
-        logger.warning(self._logstr(msg))
-
-    def _logstr(self, msg):
-        return u"%s: %s" % (self, msg)
+        logger.warning(u"%s: %s", self, msg)
 
 
 class InterfaceValue(Interface):
@@ -624,7 +761,7 @@ class InterfaceValue(Interface):
         return True
 
     def isCompatible(self, other):
-        if issubclass(other.__class__, InterfaceValue):
+        if isinstance(other, InterfaceValue):
             return super(InterfaceValue, self).isCompatible(other)
         return False
 
@@ -635,9 +772,12 @@ class InterfaceValue(Interface):
 
 class InterfaceStream(Interface):
 
+    #: buffers smaller than this stay in memory, bigger ones spill to disk
+    SPOOL_SIZE = 1 << 20
+
     def __init__(self, node, name, **kwargs):
         Interface.__init__(self, node, name, **kwargs)
-        self.stream = tempfile.NamedTemporaryFile('w+b')
+        self.stream = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE, mode='w+b')
 
     def __iter__(self):
         return iter(self.stream)
@@ -653,24 +793,27 @@ class InterfaceStream(Interface):
         self.stream.flush()
 
     def isCompatible(self, other):
-        if issubclass(other.__class__, InterfaceStream) or \
-           issubclass(other.__class__, InterfaceValue)  or \
-           issubclass(other.__class__, InterfaceList):
+        if isinstance(other, STREAMABLE_INTERFACES):
             return super(InterfaceStream, self).isCompatible(other)
         return False
 
     def load(self, other):
         Interface.load(self, other)
-        if issubclass(other.__class__, InterfaceStream):
-            #self.stream = copy.copy(other.stream)
-            self.stream = codecs.open(other.stream.name, 'rb', 'utf-8')
-            #self.stream.seek(0)
-        elif issubclass(other.__class__, InterfaceValue):
+        if isinstance(other, InterfaceStream):
+            other.stream.seek(0)
+            if len(other.successors) > 1:
+                # Several readers : each one needs its own read position
+                shutil.copyfileobj(other.stream, self.stream)
+                self.stream.seek(0)
+            else:
+                # Sole reader : take over the producer's buffer, no copy
+                self.stream = other.stream
+        elif isinstance(other, InterfaceValue):
             self.node.debug(_("Write InterfaceValue to InterfaceStream"))
             ftell = self.stream.tell()
             self.stream.write(u"%s\n" % other.value)
             self.stream.seek(ftell)
-        elif issubclass(other.__class__, InterfaceList):
+        elif isinstance(other, InterfaceList):
             ftell = self.stream.tell()
             self.node.debug(_("Write InterfaceList to InterfaceStream"))
             self.stream.write(u"\n".join(other.items))
@@ -689,7 +832,7 @@ class InterfaceList(Interface):
         return iter(self.items)
 
     def isCompatible(self, other):
-        if issubclass(other.__class__, InterfaceList):
+        if isinstance(other, InterfaceList):
             return super(InterfaceList, self).isCompatible(other)
         return False
 
@@ -698,6 +841,10 @@ class InterfaceList(Interface):
         self.items = copy.copy(other.items)
 
 
+#: interface types an L{InterfaceStream} can load from
+STREAMABLE_INTERFACES = (InterfaceStream, InterfaceValue, InterfaceList)
+
+
 class ProcessNode(Node):
     category = _(u"Basic")
     label    = _(u"")
@@ -726,42 +873,62 @@ class ValueInputNode(InputNode):
         self.output.value = self.input.value
 
 
+def nodeTypes():
+    """
+    All known L{Node} types, indexed by class name and full name.
+    Plugins must have been imported beforehand (see L{utils.import_plugins}).
+    @rtype: dict of L{Node} classes
+    """
+    types = {}
+    for cls in itersubclasses(Node):
+        types[cls.__name__]  = cls
+        types[cls.fullname()] = cls
+    return types
+
+
 #
 #    Execution classes
 #
 
 
-class NodeRunner(threading.Thread):
-
-    def __init__(self, node):
-        threading.Thread.__init__(self)
-        self.node = node
-
-    def run(self):
-        self.node.start()
-
-    def stop(self):
-        pass
-
-
 class Runner(object):
+    """
+    Executes a flow with a fixed pool of worker threads.
+    Each node is enqueued as soon as all its predecessors are done.
+    """
 
-    def __init__(self, flow):
+    def __init__(self, flow, nbworkers=None):
         self.flow = flow
+        if nbworkers is None:
+            try:
+                nbworkers = multiprocessing.cpu_count()
+            except NotImplementedError:
+                nbworkers = 4
+        self.nbworkers = nbworkers
         self.threads = []
+        self._readyqueue  = Queue.Queue()
+        self._lock        = threading.Lock()
+        self._pendingdeps = {}
+        self._remaining   = 0
 
     def start(self):
         logger.info(_("Start execution of flow..."))
-        for node in self.flow.nodes:
-            th = NodeRunner(node)
-            self.threads.append(th)
+        if empty(self.flow.nodes):
+            logger.info(_("Done."))
+            return
+        self._pendingdeps = dict((node, len(node.predecessors))
+                                 for node in self.flow.nodes)
+        self._remaining = len(self.flow.nodes)
+        self.threads = [threading.Thread(target=self._work)
+                        for i in range(min(self.nbworkers, len(self.flow.nodes)))]
+        for th in self.threads:
             th.start()
-        # Release semaphores
-        logger.debug(_("All node instantiated, waiting for their input interfaces to be ready."))
+        logger.debug(_("All workers started, enqueue start nodes."))
         for node in self.flow.startNodes:
             node.canRun.set()
+            self._readyqueue.put(node)
         # Wait the end
-        logger.debug(_("All input node started. Wait for each node to finish."))
+        logger.debug(_("All start nodes enqueued. Wait for each node to finish."))
         for th in self.threads:
             th.join()
         # Clean-up
@@ -770,6 +937,28 @@ class Runner(object):
         # Done.
         logger.info(_("Done."))
 
+    def _work(self):
+        while True:
+            node = self._readyqueue.get()
+            if node is None:
+                break
+            node.start()
+            ready = []
+            with self._lock:
+                self._remaining -= 1
+                finished = self._remaining == 0
+                for successor in node.successors:
+                    self._pendingdeps[successor] -= 1
+                    if self._pendingdeps[successor] == 0:
+                        ready.append(successor)
+            for successor in ready:
+                self._readyqueue.put(successor)
+            if finished:
+                # Wake up all workers so they shut down
+                for th in self.threads:
+                    self._readyqueue.put(None)
+
     def stop(self):
-        for th in self.threads:
-            th.stop()
+        for node in self.flow.nodes:
+            if node.running:
+                node.stop()
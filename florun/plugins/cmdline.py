@@ -1,9 +1,13 @@
+import os
 import sys
+import errno
+import signal
 import subprocess
 import shlex
+import threading
 from gettext import gettext as _
 
-from florun.flow import (FlowError, InputNode, OutputNode, ProcessNode,
+from florun.flow import (FlowError, Node, InputNode, OutputNode, ProcessNode,
                          Interface, InterfaceValue, InterfaceStream)
 from florun.utils import empty
 
@@ -27,15 +31,72 @@ class ShellProcessNode(ProcessNode):
         self.command = InterfaceValue(self,  'cmd',    default='',    type=Interface.PARAMETER, slot=False, doc="command to run")
         self.result  = InterfaceValue(self,  'result', default=0,     type=Interface.RESULT, doc="execution code return")
 
+        #: L{subprocess.Popen}, while running
+        self._proc = None
+
+    #: size of chunks exchanged with the subprocess
+    PUMP_CHUNK = 64 * 1024
+
     def run(self):
         # Run cmd with input from stdin, and send output to stdout/stderr, result code
         cmd = str(self.command.value)
         args = shlex.split(cmd)
         self.info("Run command '%s'" % args)
-        proc = subprocess.Popen(args, stdin=self.stdin.stream, stdout=self.stdout.stream, stderr=self.stderr.stream)
+        # Own process group, so stop() can terminate the whole command
+        proc = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      close_fds=True,
+                                      preexec_fn=os.setpgrp)
+        self._proc = proc
+        # Pump the three standard streams concurrently, in chunks :
+        # stdout/stderr are consumed as the process emits them, so the
+        # interface buffers fill without waiting for termination, and
+        # none of the OS pipes can fill up and deadlock the process.
+        pumps = [threading.Thread(target=self._feed,
+                                  args=(self.stdin.stream, proc.stdin)),
+                 threading.Thread(target=self._drain,
+                                  args=(proc.stdout, self.stdout)),
+                 threading.Thread(target=self._drain,
+                                  args=(proc.stderr, self.stderr))]
+        for pump in pumps:
+            pump.start()
+        for pump in pumps:
+            pump.join()
         proc.wait()
+        self._proc = None
         self.result.value = proc.returncode
 
+    def stop(self):
+        Node.stop(self)
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            os.killpg(proc.pid, signal.SIGTERM)
+
+    def _feed(self, source, sink):
+        try:
+            try:
+                while True:
+                    chunk = source.read(self.PUMP_CHUNK)
+                    if not chunk:
+                        break
+                    sink.write(chunk)
+            finally:
+                sink.close()
+        except (IOError, OSError), e:
+            # Child exited (or was stopped) without draining its stdin :
+            # a broken pipe is a normal end-of-feed, not an error.
+            if e.errno not in (errno.EPIPE, errno.EINVAL):
+                raise
+
+    def _drain(self, source, sink):
+        while True:
+            chunk = source.read(self.PUMP_CHUNK)
+            if not chunk:
+                break
+            sink.write(chunk)
+        sink.flush()
+
 
 class CommandLineParameterInputNode(InputNode):
     label       = _(u"CLI Param")
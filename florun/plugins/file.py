@@ -1,4 +1,5 @@
 import os
+import shutil
 from gettext import gettext as _
 
 from florun.flow import (FlowError, InputNode, OutputNode,
@@ -12,6 +13,9 @@ from florun.utils import empty
 
 """
 
+#: size of chunks for bulk file copies
+COPY_CHUNK = 1 << 20
+
 class FileInputNode(InputNode):
     label       = _(u"File")
     description = _(u"Read the content of a file")
@@ -27,8 +31,7 @@ class FileInputNode(InputNode):
             raise FlowError(_("Filepath empty, cannot read file."))
         self.info(_("Read content of file '%s'") % self.filepath.value)
         f = open(self.filepath.value, 'rb')
-        for line in f:
-            self.output.write(line)
+        shutil.copyfileobj(f, self.output.stream, COPY_CHUNK)
         self.output.flush()
         f.close()
 
@@ -45,8 +48,7 @@ class FileOutputNode(OutputNode):
     def run(self):
         self.info(_("Write content to file '%s'") % self.filepath.value)
         f = open(self.filepath.value, 'wb')
-        for line in self.input:
-            f.write(line)
+        shutil.copyfileobj(self.input.stream, f, COPY_CHUNK)
         f.close()
 
 
@@ -1,9 +1,10 @@
 #!/usr/bin/env python
 import gzip
+import shutil
 from gettext import gettext as _
 
 from florun import flow, gui
-from file import FileOutputNode, FileInputNode
+from file import FileOutputNode, FileInputNode, COPY_CHUNK
 
 """
 
@@ -18,8 +19,7 @@ class FileGZipOutput(FileOutputNode):
     def run(self):
         self.info(_("Write content to file '%s'") % self.filepath.value)
         f = gzip.open(self.filepath.value, 'wb')
-        for line in self.input:
-            f.write(line)
+        shutil.copyfileobj(self.input.stream, f, COPY_CHUNK)
         f.close()
 
 
@@ -30,8 +30,7 @@ class FileGZipInput(FileInputNode):
     def run(self):
         self.info(_("Read content of file '%s'") % self.filepath.value)
         f = gzip.open(self.filepath.value, 'rb')
-        for line in f:
-            self.output.write(line)
+        shutil.copyfileobj(f, self.output.stream, COPY_CHUNK)
         self.output.flush()
         f.close()
 
@@ -15,7 +15,7 @@ def empty(data):
     if type(data) == list:
         return len(data) == 0
     if type(data) == dict:
-        return len(data.keys()) == 0
+        return len(data) == 0
     return '%s' % data == ''
 
 